@@ -0,0 +1,58 @@
+import os
+import orjson
+
+# Bills history: one JSON object per line (append-only)
+HISTORY_FILE = "bills_history.jsonl"
+# Older versions stored the whole history as a single JSON list
+LEGACY_HISTORY_FILE = "bills_history.json"
+
+def migrate_history():
+    """Converts the legacy JSON list history into the JSONL history file.
+
+    Runs only when the legacy file exists and the JSONL file does not yet,
+    so it is safe to call on every run. Returns the number of migrated bills.
+    """
+    if os.path.exists(HISTORY_FILE) or not os.path.exists(LEGACY_HISTORY_FILE):
+        return 0
+
+    with open(LEGACY_HISTORY_FILE, "rb") as f:
+        legacy = orjson.loads(f.read())
+
+    # Write aside and swap in, so a crash never leaves a partial JSONL file
+    # that would stop the migration from running again
+    tmp_file = HISTORY_FILE + ".tmp"
+    with open(tmp_file, "wb") as f:
+        for item in legacy:
+            f.write(orjson.dumps(item) + b"\n")
+    os.replace(tmp_file, HISTORY_FILE)
+
+    print(f"Migrated {len(legacy)} bills from '{LEGACY_HISTORY_FILE}' to '{HISTORY_FILE}'.")
+    return len(legacy)
+
+def read_history():
+    """Returns the list of bills in the history ([] if there is none)."""
+    history = []
+    if os.path.exists(HISTORY_FILE):
+        with open(HISTORY_FILE, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    history.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    print("Skipping unreadable line in history file.")
+    return history
+
+def open_history_for_append():
+    """Opens the history for appending one bill per line.
+
+    A write cut short leaves the last line without its newline; it is
+    terminated first so the next bill doesn't land on the same line.
+    """
+    f = open(HISTORY_FILE, "ab")
+    if f.tell() > 0:
+        with open(HISTORY_FILE, "rb") as existing:
+            existing.seek(-1, os.SEEK_END)
+            if existing.read(1) != b"\n":
+                f.write(b"\n")
+    return f
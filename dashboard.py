@@ -1,9 +1,15 @@
 import streamlit as st
 import pandas as pd
-import json
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from data import load_data
+
+MONTHS_PT = (
+    "JANEIRO", "FEVEREIRO", "MARÇO", "ABRIL", "MAIO", "JUNHO",
+    "JULHO", "AGOSTO", "SETEMBRO", "OUTUBRO", "NOVEMBRO", "DEZEMBRO"
+)
 
 # Page Config
 st.set_page_config(page_title="Monitor de Contas Light RJ", layout="wide")
@@ -37,64 +43,27 @@ with st.sidebar:
             except Exception as e:
                 st.error(f"Erro ao atualizar: {e}")
 
-# --- Data Loading ---
-@st.cache_data
-def load_data():
-    # Load Bills
-    bills_data = []
-    try:
-        with open("bills_history.json", "r", encoding="utf-8") as f:
-            bills_data = json.load(f)
-    except FileNotFoundError:
-        st.error("Arquivo bills_history.json não encontrado.")
-        return pd.DataFrame(), pd.DataFrame()
-
-    # Load Weather
-    weather_data_raw = {}
-    try:
-        with open("weather_history.json", "r", encoding="utf-8") as f:
-            weather_data_raw = json.load(f)
-    except FileNotFoundError:
-        st.warning("Arquivo weather_history.json não encontrado. Dados climáticos não serão exibidos.")
-    
-    # Process Weather to DataFrame
-    weather_df = pd.DataFrame()
-    if weather_data_raw:
-        weather_df = pd.DataFrame(weather_data_raw.get("daily", {}))
-        weather_df["time"] = pd.to_datetime(weather_df["time"])
-        weather_df.set_index("time", inplace=True)
-
-    # Process Bills to DataFrame & Correlate
-    processed_bills = []
-    for bill in bills_data:
-        # Convert date
-        try:
-            read_date = datetime.strptime(bill["leitura_atual"], "%d/%m/%Y")
-        except:
-            continue
-            
-        bill["data_leitura"] = read_date
-        
-        # Calculate Avg Temp for previous 30 days
-        avg_temp = None
-        if not weather_df.empty:
-            start_date = read_date - timedelta(days=30)
-            mask = (weather_df.index >= start_date) & (weather_df.index <= read_date)
-            period_temps = weather_df.loc[mask, "temperature_2m_mean"]
-            if not period_temps.empty:
-                avg_temp = period_temps.mean()
-        
-        bill["temp_media"] = avg_temp
-        processed_bills.append(bill)
-        
-    df_bills = pd.DataFrame(processed_bills)
-    
-    # Sorting
-    if not df_bills.empty:
-        df_bills.sort_values("data_leitura", inplace=True)
-
-    return df_bills, weather_df
+# --- Forecast Helpers ---
+def hybrid_mean(past, future, target_len=30, fallback=25.0):
+    """Averages real (past) and forecast (future) temperatures over a cycle.
+
+    Days missing to reach ``target_len`` are filled with the average of the
+    known days, or with ``fallback`` when there are none.
+    """
+    n = len(past) + len(future)
+    out = np.empty(max(n, target_len), dtype=np.float32)
+    out[:len(past)] = past
+    out[len(past):n] = future
+    out[n:] = out[:n].mean() if n else fallback
+    return float(out.mean())
+
+# Forecasts change slowly; avoid an API round-trip on every rerun
+@st.cache_data(ttl=3600, show_spinner=False)
+def get_forecast(days):
+    from extract_weather import fetch_forecast
+    return fetch_forecast(days=days)
 
+# --- Data Loading ---
 df_bills, df_weather = load_data()
 
 if df_bills.empty:
@@ -115,15 +84,15 @@ valid_bills = df_bills.dropna(subset=['temp_media', 'consumo_kwh', 'valor_total'
 projection_data = None
 
 if not df_weather.empty and not valid_bills.empty:
-    # 1. Model Training
-    valid_bills['efficiency_factor'] = valid_bills['consumo_kwh'] / valid_bills['temp_media']
-    avg_factor = valid_bills['efficiency_factor'].mean()
-    avg_cost_kwh = (valid_bills['valor_total'] / valid_bills['consumo_kwh']).mean()
+    # 1. Model Training (plain array reductions, no intermediate Series)
+    kwh = valid_bills['consumo_kwh'].to_numpy(dtype=np.float32)
+    temp = valid_bills['temp_media'].to_numpy(dtype=np.float32)
+    val = valid_bills['valor_total'].to_numpy(dtype=np.float32)
+    avg_factor = (kwh / temp).mean()
+    avg_cost_kwh = (val / kwh).mean()
     
     # 2. Hybrid Forecast Calculation
     try:
-        from extract_weather import fetch_forecast, get_start_date
-        
         # Determine Current Billing Cycle
         last_bill_date = valid_bills["data_leitura"].iloc[-1]
         cycle_start = last_bill_date + timedelta(days=1)
@@ -137,34 +106,22 @@ if not df_weather.empty and not valid_bills.empty:
             days_future = (cycle_end - today).days
             
             # Fetch Forecast
-            forecast_data = fetch_forecast(days=max(1, days_future + 5)) # Buffer
-            
-            past_temps = []
-            future_temps = []
+            forecast_data = get_forecast(days=max(1, days_future + 5)) # Buffer
             
             # Get Past Temps (Real)
-            mask = (df_weather.index >= cycle_start) & (df_weather.index < today)
-            past_temps = df_weather.loc[mask, "temperature_2m_mean"].tolist()
+            past_temps = df_weather.loc[cycle_start:today, "temperature_2m_mean"].to_numpy()
+            future_temps = np.empty(0, dtype=np.float32)
             
             # Get Future Temps (Forecast)
             if forecast_data and 'daily' in forecast_data:
-                f_dates = forecast_data['daily']['time']
-                f_temps = forecast_data['daily']['temperature_2m_mean']
+                f_dates = pd.to_datetime(forecast_data['daily']['time'], format="%Y-%m-%d")
+                f_temps = np.asarray(forecast_data['daily']['temperature_2m_mean'], dtype=np.float32)
                 
-                for d, t in zip(f_dates, f_temps):
-                    d_obj = datetime.strptime(d, "%Y-%m-%d")
-                    if d_obj >= today and d_obj <= cycle_end:
-                         future_temps.append(t)
+                mask = (f_dates >= today) & (f_dates <= cycle_end)
+                future_temps = f_temps[mask]
             
-            # Fill missing future days with average if forecast is short
-            full_temps = past_temps + future_temps
-            if len(full_temps) < 30:
-                missing = 30 - len(full_temps)
-                avg_so_far = sum(full_temps)/len(full_temps) if full_temps else 25.0
-                full_temps.extend([avg_so_far] * missing)
-                
-            # Hybrid Average
-            hybrid_avg_temp = sum(full_temps) / len(full_temps)
+            # Hybrid Average (missing future days filled with average if forecast is short)
+            hybrid_avg_temp = hybrid_mean(past_temps, future_temps)
             
             # Predict
             pred_consumption = avg_factor * hybrid_avg_temp
@@ -172,20 +129,14 @@ if not df_weather.empty and not valid_bills.empty:
             
             # Create Projection Data Entry
             next_month_date = cycle_start + timedelta(days=15)
-            month_map = {
-                1: "JANEIRO", 2: "FEVEREIRO", 3: "MARÇO", 4: "ABRIL",
-                5: "MAIO", 6: "JUNHO", 7: "JULHO", 8: "AGOSTO",
-                9: "SETEMBRO", 10: "OUTUBRO", 11: "NOVEMBRO", 12: "DEZEMBRO"
-            }
-            next_month_pt = month_map.get(next_month_date.month, "MÊS")
+            next_month_pt = MONTHS_PT[next_month_date.month - 1]
             next_month_str = f"{next_month_pt}/{next_month_date.year}"
             
             projection_data = {
                 "mes_referencia": f"PROJEÇÃO {next_month_str}",
                 "consumo_kwh": pred_consumption,
                 "valor_total": pred_cost,
-                "temp_media": hybrid_avg_temp,
-                "type": "Projeção"
+                "temp_media": hybrid_avg_temp
             }
             
     except Exception as e:
@@ -195,34 +146,31 @@ if not df_weather.empty and not valid_bills.empty:
 
 st.subheader("Evolution: Consumption vs. Temperature")
 
-# Prepare Chart Data
-chart_df = df_bills.copy()
-chart_df["type"] = "Real"
-
-if projection_data:
-    # Append projection
-    proj_df = pd.DataFrame([projection_data])
-    chart_df = pd.concat([chart_df, proj_df], ignore_index=True)
+# Prepare Chart Data (plain arrays, projection appended as one extra point)
+projections = [projection_data] if projection_data else []
+x = np.concatenate([df_bills["mes_referencia"].to_numpy(dtype=object), [p["mes_referencia"] for p in projections]])
+y_consumo = np.concatenate([df_bills["consumo_kwh"].to_numpy(dtype=np.float64), [p["consumo_kwh"] for p in projections]])
+y_temp = np.concatenate([df_bills["temp_media"].to_numpy(dtype=np.float64), [p["temp_media"] for p in projections]])
 
 fig_combo = go.Figure()
 
 # Bar: Consumption (Color by Type)
-colors = ['#F5B041' if t == "Real" else '#AED6F1' for t in chart_df["type"]] # Orange for Real, Light Blue for Proj
+colors = ['#F5B041'] * len(df_bills) + ['#AED6F1'] * len(projections) # Orange for Real, Light Blue for Proj
 
 fig_combo.add_trace(go.Bar(
-    x=chart_df["mes_referencia"],
-    y=chart_df["consumo_kwh"],
+    x=x,
+    y=y_consumo,
     name="Consumo (kWh)",
     marker_color=colors,
-    text=[f"{v:.0f}" for v in chart_df["consumo_kwh"]], # Show values
+    text=[f"{v:.0f}" for v in y_consumo], # Show values
     textposition='auto'
 ))
 
 # Line: Temperature
 if not df_weather.empty:
-    fig_combo.add_trace(go.Scatter(
-        x=chart_df["mes_referencia"],
-        y=chart_df["temp_media"],
+    fig_combo.add_trace(go.Scattergl(
+        x=x,
+        y=y_temp,
         name="Temp. Média (°C)",
         yaxis="y2",
         line=dict(color='#E74C3C', width=3, dash='dot') # Dashed line for effect
@@ -246,9 +194,6 @@ if not df_weather.empty and 'temp_media' in df_bills.columns:
         "Amarela e Vermelha": "orange" 
     }
     
-    # Handle cases where flag might be null or mixed case
-    df_bills['bandeira_tarifaria'] = df_bills['bandeira_tarifaria'].fillna('Verde')
-    
     fig_scatter = px.scatter(
         df_bills, 
         x="temp_media", 
@@ -256,6 +201,7 @@ if not df_weather.empty and 'temp_media' in df_bills.columns:
         size="consumo_kwh", 
         color="bandeira_tarifaria",
         hover_data=["mes_referencia"],
+        render_mode="webgl",
         title="Impacto da Temperatura no Valor da Conta",
         labels={"temp_media": "Temperatura Média (°C)", "valor_total": "Valor da Conta (R$)"}
     )
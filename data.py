@@ -0,0 +1,144 @@
+import streamlit as st
+import pandas as pd
+import os
+from bills_history import HISTORY_FILE, migrate_history, read_history
+
+BILLS_FILE = HISTORY_FILE
+WEATHER_FILE = "weather_history.json"
+
+# Processed DataFrames persisted across app restarts. Bump CACHE_VERSION
+# whenever build_frames changes what it produces (columns, dtypes...), so
+# caches written by older code are never served.
+CACHE_DIR = "cache"
+CACHE_VERSION = 1
+BILLS_CACHE = os.path.join(CACHE_DIR, f"bills.v{CACHE_VERSION}.parquet")
+WEATHER_CACHE = os.path.join(CACHE_DIR, f"weather.v{CACHE_VERSION}.parquet")
+
+def get_mtime(path):
+    """Returns the file modification time, or None if the file does not exist."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def read_parquet_cache(*source_mtimes):
+    """Returns the cached (df_bills, weather_df) if newer than all sources, else None."""
+    cache_mtimes = [get_mtime(BILLS_CACHE), get_mtime(WEATHER_CACHE)]
+    if None in cache_mtimes or min(cache_mtimes) < max(source_mtimes):
+        return None
+    try:
+        return pd.read_parquet(BILLS_CACHE, engine="pyarrow"), pd.read_parquet(WEATHER_CACHE, engine="pyarrow")
+    except Exception as e:
+        print(f"Ignoring unreadable parquet cache: {e}")
+        return None
+
+def write_parquet_cache(df_bills, weather_df):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df_bills.to_parquet(BILLS_CACHE, engine="pyarrow", compression="zstd")
+        weather_df.to_parquet(WEATHER_CACHE, engine="pyarrow", compression="zstd")
+    except Exception as e:
+        # The cache is only an optimization, e.g. free-form nested fields
+        # returned by Gemini may not map to a parquet schema
+        print(f"Could not write parquet cache: {e}")
+
+# Cached functions take the file mtime as an argument so that an unchanged
+# file is served from memory and any write to it invalidates the entry.
+@st.cache_data
+def read_bills(mtime):
+    return read_history()
+
+@st.cache_data
+def load_weather_df(mtime):
+    # Shares the parsed history with the refresh flow instead of re-reading it
+    from extract_weather import load_weather
+    weather_data_raw = load_weather()
+
+    weather_df = pd.DataFrame()
+    if weather_data_raw:
+        weather_df = pd.DataFrame(weather_data_raw.get("daily", {}))
+        weather_df["time"] = pd.to_datetime(weather_df["time"])
+        weather_df.set_index("time", inplace=True)
+        # Sorted once so rolling windows and date slices (.loc[start:end]) use binary search
+        weather_df.sort_index(inplace=True)
+        # Temperatures don't need float64 precision; halves memory for rolling/merge
+        weather_df = weather_df.astype("float32")
+    return weather_df
+
+@st.cache_data
+def build_frames(bills_mtime, weather_mtime):
+    # Load Bills
+    if bills_mtime is None:
+        st.error(f"Arquivo {BILLS_FILE} não encontrado.")
+        return pd.DataFrame(), pd.DataFrame()
+
+    if weather_mtime is not None:
+        cached = read_parquet_cache(bills_mtime, weather_mtime)
+        if cached is not None:
+            return cached
+
+    bills_data = read_bills(bills_mtime)
+
+    # Load Weather
+    weather_df = pd.DataFrame()
+    if weather_mtime is None:
+        st.warning(f"Arquivo {WEATHER_FILE} não encontrado. Dados climáticos não serão exibidos.")
+    else:
+        weather_df = load_weather_df(weather_mtime)
+
+    # Process Bills to DataFrame (bills without a valid reading date are skipped)
+    df_bills = pd.DataFrame(bills_data)
+    if "leitura_atual" not in df_bills:
+        return pd.DataFrame(), weather_df
+
+    # Fixed unit so the merge keys below match whatever unit pandas infers
+    df_bills["data_leitura"] = pd.to_datetime(
+        df_bills["leitura_atual"], format="%d/%m/%Y", errors="coerce"
+    ).astype("datetime64[ns]")
+    df_bills = df_bills.dropna(subset=["data_leitura"]).sort_values("data_leitura")
+    if df_bills.empty:
+        return df_bills, weather_df
+
+    # Correlate: Avg Temp for previous 30 days (inclusive) of each reading
+    if weather_df.empty:
+        df_bills["temp_media"] = float("nan")
+    else:
+        # Daily index covering every reading date, so each bill gets an exact match
+        daily_index = pd.date_range(
+            weather_df.index.min(),
+            max(weather_df.index.max(), df_bills["data_leitura"].max()),
+            freq="D",
+            name="time"
+        ).astype("datetime64[ns]")
+        temp_media = (
+            weather_df["temperature_2m_mean"]
+            .reindex(daily_index)
+            .rolling("31D", min_periods=1)
+            .mean()
+            .rename("temp_media")
+        )
+        df_bills = pd.merge_asof(
+            df_bills,
+            temp_media.reset_index(),
+            left_on="data_leitura",
+            right_on="time",
+            direction="backward"
+        ).drop(columns="time")
+
+    # Downcast temperatures only; money (valor_total) keeps float64 so totals stay exact to the cent
+    df_bills["temp_media"] = df_bills["temp_media"].astype("float32")
+
+    # Flags repeat across bills: store as categorical (missing flag means Verde)
+    if "bandeira_tarifaria" in df_bills.columns:
+        df_bills["bandeira_tarifaria"] = df_bills["bandeira_tarifaria"].fillna("Verde").astype("category")
+
+    if weather_mtime is not None:
+        write_parquet_cache(df_bills, weather_df)
+
+    return df_bills, weather_df
+
+def load_data():
+    """Returns (df_bills, weather_df), rebuilt only when a source file changes."""
+    # Older installs only have the JSON list history
+    migrate_history()
+    return build_frames(get_mtime(BILLS_FILE), get_mtime(WEATHER_FILE))
@@ -1,8 +1,11 @@
 import os
 import time
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import orjson
 import google.generativeai as genai
 from dotenv import load_dotenv
+from bills_history import migrate_history, open_history_for_append, read_history
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +18,34 @@ if not api_key:
 
 genai.configure(api_key=api_key)
 
+# Bills are I/O bound (upload + processing wait), so extract a few at a time
+MAX_WORKERS = 4
+# Gemini requests started per second, shared by all workers
+REQUESTS_PER_SECOND = 0.5
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second (bursts up to `burst`)."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 def upload_to_gemini(path, mime_type=None):
     """Uploads the given file to Gemini.
 
@@ -29,14 +60,17 @@ def wait_for_files_active(files):
 
     Some files uploaded to the Gemini API need to be processed before they can
     be used as prompt inputs. The status will be in the "processing" state.
-    This function waits for a file to become "active".
+    This function waits for a file to become "active", polling with an
+    exponential backoff so small files are picked up almost immediately.
     """
     print("Waiting for file processing...")
     for name in (file.name for file in files):
         file = genai.get_file(name)
+        delay = 0.5
         while file.state.name == "PROCESSING":
             print(".", end="", flush=True)
-            time.sleep(10)
+            time.sleep(delay)
+            delay = min(delay * 1.5, 10.0)
             file = genai.get_file(name)
         if file.state.name != "ACTIVE":
             raise Exception(f"File {file.name} failed to process")
@@ -81,11 +115,35 @@ def extract_data(pdf_path):
     print("Response received.")
     return response.text
 
-def process_all_faturas():
-    import glob
+def extract_bill(pdf_path, rate_limiter):
+    """Extracts a single bill.
+
+    Returns (filename, data) on success or (filename, exception) on failure,
+    so it can run in a worker thread without raising.
+    """
+    filename = os.path.basename(pdf_path)
+    try:
+        rate_limiter.acquire()
+        print(f"\nProcessing '{filename}'...")
+        json_result = extract_data(pdf_path)
+
+        # Basic validation and parsing
+        data = orjson.loads(json_result)
+        if not isinstance(data, dict):
+            raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+
+        # Add metadata
+        data["arquivo_origem"] = filename
+        data["data_processamento"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    except Exception as e:
+        return filename, e
+
+    return filename, data
 
+def process_all_faturas():
     faturas_dir = "Faturas"
-    history_file = "bills_history.json"
+
+    migrate_history()
 
     # Ensure Faturas directory exists
     if not os.path.isdir(faturas_dir):
@@ -93,59 +151,58 @@ def process_all_faturas():
         return 0
 
     # Load existing history
-    history = []
-    if os.path.exists(history_file):
-        try:
-            with open(history_file, "r", encoding="utf-8") as f:
-                history = json.load(f)
-        except json.JSONDecodeError:
-            print("Error reading history file. Starting fresh.")
+    history = read_history()
     
     # Create a set of processed filenames for quick lookup
     # Normalize paths/names to avoid duplicates on slightly different paths
     processed_files = {item.get("arquivo_origem") for item in history if item.get("arquivo_origem")}
 
-    pdf_files = glob.glob(os.path.join(faturas_dir, "*.pdf"))
+    # Single directory pass, keeping only PDFs not processed yet
+    # (hidden files such as macOS "._" copies are skipped, as glob did)
+    pdf_count = 0
+    pending = []
+    with os.scandir(faturas_dir) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.startswith(".") and entry.name.lower().endswith(".pdf"):
+                pdf_count += 1
+                if entry.name not in processed_files:
+                    pending.append(entry.path)
     
-    if not pdf_files:
+    if not pdf_count:
         print(f"No PDF files found in '{faturas_dir}'.")
         return 0
 
-    print(f"Found {len(pdf_files)} PDF files.")
+    print(f"Found {pdf_count} PDF files.")
     
     new_data_count = 0
 
-    for pdf_path in pdf_files:
-        filename = os.path.basename(pdf_path)
-        
-        if filename in processed_files:
-            continue
+    rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
 
-        print(f"\nProcessing '{filename}'...")
-        try:
-            json_result = extract_data(pdf_path)
-            
-            # Basic validation and parsing
-            data = json.loads(json_result)
-            
-            # Add metadata
-            data["arquivo_origem"] = filename
-            data["data_processamento"] = time.strftime("%Y-%m-%d %H:%M:%S")
-
-            history.append(data)
+    # Workers only extract; results are written from this thread as they finish
+    with open_history_for_append() as history_out, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(extract_bill, pdf_path, rate_limiter): os.path.basename(pdf_path)
+            for pdf_path in pending
+        }
+        for future in as_completed(futures):
+            try:
+                filename, result = future.result()
+            except Exception as e:
+                # Never let one file discard the results of the others
+                filename, result = futures[future], e
+            if isinstance(result, Exception):
+                print(f"Failed to process '{filename}': {result}")
+                continue
+
+            history.append(result)
             processed_files.add(filename)
             new_data_count += 1
-            
-            # Save incrementally (optional, but safer)
-            with open(history_file, "w", encoding="utf-8") as f:
-                json.dump(history, f, indent=4, ensure_ascii=False)
-                
-            print(f"Successfully processed '{filename}'")
-            # Avoid hitting rate limits too hard
-            time.sleep(2) 
 
-        except Exception as e:
-            print(f"Failed to process '{filename}': {e}")
+            # Append only the new bill; flush so a crash keeps what was done
+            history_out.write(orjson.dumps(result) + b"\n")
+            history_out.flush()
+
+            print(f"Successfully processed '{filename}'")
 
     print(f"\nProcessing complete. {new_data_count} new bills added.")
     print(f"Total entries in history: {len(history)}")
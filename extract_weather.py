@@ -1,50 +1,66 @@
 import requests
-import json
+import orjson
 import os
+import pandas as pd
+from bills_history import migrate_history, read_history
 from datetime import datetime, timedelta
 
 # Configuration
 LATITUDE = -22.839445 
 LONGITUDE = -43.398826
 WEATHER_FILE = "weather_history.json"
-BILLS_FILE = "bills_history.json"
+
+# Shared session so consecutive Open-Meteo calls reuse the same connection
+session = requests.Session()
+
+# Last parsed weather history and the WEATHER_FILE mtime it was read at
+weather_cache = {"mtime": None, "data": {}}
+
+def load_weather():
+    """Returns the parsed weather history ({} if there is none).
+
+    The file is only re-read when its mtime changes, so repeated refreshes
+    with nothing new don't re-parse it. Callers must not modify the result.
+    """
+    try:
+        mtime = os.path.getmtime(WEATHER_FILE)
+    except OSError:
+        return {}
+
+    if mtime != weather_cache["mtime"]:
+        with open(WEATHER_FILE, "rb") as f:
+            weather_cache["data"] = orjson.loads(f.read())
+        weather_cache["mtime"] = mtime
+    return weather_cache["data"]
 
 def get_start_date():
     """Determines the start date for weather data collection."""
     # 1. Check if we already have weather data
-    if os.path.exists(WEATHER_FILE):
-        try:
-            with open(WEATHER_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if data and "daily" in data and "time" in data["daily"]:
-                     # Get the last date in the weather history
-                    last_date_str = data["daily"]["time"][-1]
-                    last_date = datetime.strptime(last_date_str, "%Y-%m-%d")
-                    return last_date + timedelta(days=1)
-        except Exception as e:
-            print(f"Error reading existing weather file: {e}")
+    try:
+        data = load_weather()
+        if data and "daily" in data and "time" in data["daily"]:
+             # Get the last date in the weather history
+            last_date_str = data["daily"]["time"][-1]
+            last_date = datetime.fromisoformat(last_date_str)
+            return last_date + timedelta(days=1)
+    except Exception as e:
+        print(f"Error reading existing weather file: {e}")
 
     # 2. If no weather data, infer from bills
-    if os.path.exists(BILLS_FILE):
-        try:
-            with open(BILLS_FILE, "r", encoding="utf-8") as f:
-                bills = json.load(f)
-                if bills:
-                    # Find the earliest reading date
-                    dates = []
-                    for b in bills:
-                        # Try parsing various date formats if necessary, but assuming 'leitura_atual' is consistently DD/MM/YYYY
-                        try:
-                            dates.append(datetime.strptime(b["leitura_atual"], "%d/%m/%Y"))
-                        except:
-                            pass
-                    
-                    if dates:
-                        earliest_reading = min(dates)
-                        # Go back ~35 days from the first reading to cover the consumption period
-                        return earliest_reading - timedelta(days=35)
-        except Exception as e:
-            print(f"Error reading bills file: {e}")
+    try:
+        # Older installs only have the JSON list history
+        migrate_history()
+        bills = read_history()
+        if bills:
+            # Find the earliest reading date ('leitura_atual' is DD/MM/YYYY)
+            dates = pd.to_datetime([b.get("leitura_atual") for b in bills], format="%d/%m/%Y", errors="coerce")
+            earliest_reading = dates.min()
+
+            if not pd.isna(earliest_reading):
+                # Go back ~35 days from the first reading to cover the consumption period
+                return earliest_reading.to_pydatetime() - timedelta(days=35)
+    except Exception as e:
+        print(f"Error reading bills file: {e}")
     
     # 3. Default fallback (e.g., 1 year ago)
     return datetime.now() - timedelta(days=365)
@@ -56,12 +72,12 @@ def fetch_weather(start_date, end_date):
         "longitude": LONGITUDE,
         "start_date": start_date.strftime("%Y-%m-%d"),
         "end_date": end_date.strftime("%Y-%m-%d"),
-        "daily": ["temperature_2m_max", "temperature_2m_min", "temperature_2m_mean"],
+        "daily": ["temperature_2m_mean"],
         "timezone": "America/Sao_Paulo"
     }
     
     print(f"Fetching weather from {params['start_date']} to {params['end_date']}...")
-    response = requests.get(url, params=params)
+    response = session.get(url, params=params, timeout=20)
     response.raise_for_status()
     return response.json()
 
@@ -70,13 +86,13 @@ def fetch_forecast(days=14):
     params = {
         "latitude": LATITUDE,
         "longitude": LONGITUDE,
-        "daily": ["temperature_2m_max", "temperature_2m_min", "temperature_2m_mean"],
+        "daily": ["temperature_2m_mean"],
         "timezone": "America/Sao_Paulo",
         "forecast_days": days
     }
     
     print(f"Fetching forecast for next {days} days...")
-    response = requests.get(url, params=params)
+    response = session.get(url, params=params, timeout=20)
     response.raise_for_status()
     return response.json()
 
@@ -84,10 +100,13 @@ def merge_data(existing, new_data):
     if not existing:
         return new_data
     
-    # Append new daily data to existing arrays
-    for key in existing["daily"]:
-        if key in new_data["daily"]:
-            existing["daily"][key].extend(new_data["daily"][key])
+    # Append new daily data to existing arrays; fields no longer fetched
+    # (e.g. max/min temperatures) are dropped so all arrays keep the same length
+    existing["daily"] = {
+        key: values + new_data["daily"][key]
+        for key, values in existing["daily"].items()
+        if key in new_data["daily"]
+    }
             
     return existing
 
@@ -105,17 +124,19 @@ def update_weather_data():
         new_weather = fetch_weather(start_date, end_date)
         
         existing_weather = {}
-        if os.path.exists(WEATHER_FILE):
-            try:
-                with open(WEATHER_FILE, "r", encoding="utf-8") as f:
-                    existing_weather = json.load(f)
-            except:
-                pass
+        try:
+            existing_weather = load_weather()
+        except:
+            pass
 
+        # merge_data updates the cached object; drop the cache until it is saved
+        weather_cache["mtime"] = None
         updated_weather = merge_data(existing_weather, new_weather)
         
-        with open(WEATHER_FILE, "w", encoding="utf-8") as f:
-            json.dump(updated_weather, f, indent=4)
+        with open(WEATHER_FILE, "wb") as f:
+            f.write(orjson.dumps(updated_weather, option=orjson.OPT_INDENT_2))
+        weather_cache["data"] = updated_weather
+        weather_cache["mtime"] = os.path.getmtime(WEATHER_FILE)
             
         print(f"Weather data saved to '{WEATHER_FILE}'.")
         return True